@@ -1,44 +1,155 @@
-from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
 from datetime import datetime
 
-# Open CSV file and load data into DataFrame
-data = pd.read_csv('.\\benchmark_results\\local.CSV', encoding='latin-1', decimal='.', thousands=',')
-# Remove leading/trailing whitespace and special characters (like BOM) from column names
-data.columns = data.columns.str.strip().str.replace('\ufeff', '', regex=False)
+try:
+    from tsdownsample import MinMaxLTTBDownsampler
+except ImportError:  # optional; fall back to plain min/max bucketing
+    MinMaxLTTBDownsampler = None
+
+# Maximum number of points drawn per power trace
+PLOT_POINTS = 2000
+
+
+def downsample_indices(x, y, n_out=PLOT_POINTS):
+    """Return sorted indices of at most n_out samples of y that keep its visual shape.
+
+    x holds the ascending sample times as int64. Buckets span equal time rather than equal
+    sample counts, so logger pauses do not stretch or squeeze the trace.
+    """
+    if len(y) <= n_out:
+        return np.arange(len(y))
+    if MinMaxLTTBDownsampler is not None:
+        return MinMaxLTTBDownsampler().downsample(x, y, n_out=n_out)
+    # Keep the minimum and maximum of each time bucket so peaks are not lost; buckets inside a pause are empty
+    offsets = x - x[0]
+    edges = np.searchsorted(offsets, np.linspace(0, offsets[-1], n_out // 2 + 1))
+    edges[-1] = len(y)
+    idx = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            segment = y[lo:hi]
+            idx.extend((lo + segment.argmin(), lo + segment.argmax()))
+    return np.unique(idx)
+
+
+def nearest_indices(ts, req):
+    """Return, for every time in req, the position of the closest time in the non-empty array ts.
+
+    ts must be ascending; the HWiNFO log is sorted by timestamp when it is loaded.
+    """
+    if len(ts) == 1:
+        return np.zeros(len(req), dtype=np.intp)
+    
+    ts = ts.view('i8')
+    req = req.view('i8')
+    pos = np.clip(np.searchsorted(ts, req), 1, len(ts) - 1)
+    return np.where(np.abs(req - ts[pos - 1]) <= np.abs(ts[pos] - req), pos - 1, pos)
+
+
+def plot_power_metrics(data_filtered, request_df, existing_columns, category_colors):
+    """Plot each metric with the request time bands, one row per metric sharing the time axis."""
+    # Matplotlib is only needed here; importing it lazily keeps the data preparation fast to start
+    from matplotlib import pyplot as plt
+    from matplotlib import dates as mdates
+    from matplotlib.collections import PolyCollection
+    
+    # Build the request time bands once: the rectangles and color of each category, in order of first appearance
+    request_bands = {}
+    if len(request_df) > 0:
+        starts = mdates.date2num(request_df['timestamp_send'].to_numpy())
+        ends = mdates.date2num(request_df['timestamp_response'].to_numpy())
+        # Vertices in (data x, axes y) coordinates so each band spans the full height, shape (n_requests, 4, 2)
+        xs = np.column_stack([starts, starts, ends, ends])
+        ys = np.broadcast_to([0.0, 1.0, 1.0, 0.0], xs.shape)
+        verts = np.stack([xs, ys], axis=-1)
+        
+        # Integer category codes select each category's rectangles without a per-row loop
+        codes, categories = pd.factorize(request_df['size_category'])
+        for code, category in enumerate(categories):
+            request_bands[category] = (verts[codes == code], category_colors.get(category, 'lightgray'))
+    
+    # Plot power metrics with request time bands
+    if existing_columns:
+        fig, axes = plt.subplots(len(existing_columns), 1, figsize=(14, 3 * len(existing_columns)),
+                                 sharex=True, squeeze=False)
+        timestamps = data_filtered['timestamp'].to_numpy()
+        sample_times = timestamps.view('i8')
+        
+        for ax1, column in zip(axes[:, 0], existing_columns):
+            # Plot power data vs timestamp, downsampled to roughly the number of points that can be seen
+            values = data_filtered[column].to_numpy(dtype=np.float64)
+            idx = downsample_indices(sample_times, values)
+            ax1.plot(timestamps[idx], values[idx], label=column, color='blue', linewidth=1.5)
+            ax1.set_ylabel('Power (W)', color='blue', fontsize=12)
+            ax1.tick_params(axis='y', labelcolor='blue')
+            ax1.grid(True, alpha=0.3)
+            
+            # Add time bands for each request, drawing all spans of a category as a single artist
+            for category, (verts, color) in request_bands.items():
+                ax1.add_collection(PolyCollection(
+                    verts,
+                    transform=ax1.get_xaxis_transform(),
+                    facecolor=color,
+                    edgecolor='none',
+                    alpha=0.3,
+                    label=f'{category.capitalize()} Request'
+                ), autolim=False)
+            
+            ax1.set_title(f'{column} with LLM Request Time Periods', fontsize=14, fontweight='bold')
+            ax1.legend(loc='lower left')
+        
+        axes[-1, 0].set_xlabel('Time', fontsize=12)
+        
+        # Format x-axis for better readability
+        fig.autofmt_xdate()
+        fig.tight_layout()
+    
+    plt.show()
 
-# Show the first few rows of the DataFrame
-print(data.head())
-print(f"\nColumn names: {data.columns[:5].tolist()}")  # Print first 5 column names to verify
 
-# Filter columns to keep only the relevant metrics
+# Relevant metrics to load from the CSV
 columns_to_keep = [
     'Potenza totale CPU [W]',
     "CPU Package Power [W]",
     'Potenza Core IA [W]',
     "IA Cores Power [W]",
     'VR VCC Corrente (SVID IOUT) [A]',
-    "VR VCC Current (SVID IOUT) [A]"
+    "VR VCC Current (SVID IOUT) [A]",
     'GPU Potenza [W]',
     "GPU Power [W]",
     'IGPU Potenza [W]',
-    "IGPU Power [W]"
+    "IGPU Power [W]",
     'Potenza DRAM totale [W]',
+    "Total DRAM Power [W]",
     'Consumo energetico resto del chip [W]',
     'Rest-of-Chip Power [W]'
 ]
 
-# Keep only columns that exist in the DataFrame
-existing_columns = [col for col in columns_to_keep if col in data.columns]
-data_filtered = data[existing_columns]
+# Open CSV file and load data into DataFrame
+# HWiNFO logs have hundreds of sensor columns: parse only the timestamp and the metrics we plot
+wanted_columns = {'Date', 'Time', *columns_to_keep}
+data = pd.read_csv(
+    '.\\benchmark_results\\local.CSV',
+    encoding='latin-1',
+    decimal='.',
+    thousands=',',
+    usecols=lambda col: col.strip().replace('\ufeff', '') in wanted_columns
+)
+# Remove leading/trailing whitespace and special characters (like BOM) from column names
+data.columns = data.columns.str.strip().str.replace('\ufeff', '', regex=False)
+
+# Show the first few rows of the DataFrame
+print(data.head())
+print(f"\nColumn names: {data.columns[:5].tolist()}")  # Print first 5 column names to verify
 
-# Convert all columns to numeric values, handling errors
-for col in data_filtered.columns:
-    data_filtered[col] = pd.to_numeric(data_filtered[col], errors='coerce')
+# Keep only columns that exist in the DataFrame
+data_columns = frozenset(data.columns)
+existing_columns = [col for col in columns_to_keep if col in data_columns]
 
-# Replace NaN values with 0
-data_filtered = data_filtered.fillna(0)
+# Convert all columns to numeric values, handling errors (HWiNFO footer rows become NaN),
+# and replace NaN values with 0
+data_filtered = data[existing_columns].apply(pd.to_numeric, errors='coerce').fillna(0)
 
 print(data_filtered.head())
 print(data_filtered.dtypes)
@@ -63,11 +174,13 @@ import json
 
 # Convert the first two time-related columns to datetime
 # Combine Date and Time columns to create a datetime column
-data_filtered['timestamp'] = pd.to_datetime(
-    data['Date'] + ' ' + data['Time'],
-    format='%d.%m.%Y %H:%M:%S.%f',
-    errors='coerce'
-)
+# Parse them separately and add: a log spans only a few dates, so the cached date parse is nearly free
+dates = pd.to_datetime(data['Date'], format='%d.%m.%Y', errors='coerce', cache=True)
+times = pd.to_timedelta(data['Time'], errors='coerce')
+data_filtered['timestamp'] = dates + times
+# Drop rows without a timestamp (HWiNFO footer rows) and order by time: the window slice,
+# the nearest-sample match and the plot downsampling all rely on ascending timestamps
+data_filtered = data_filtered.dropna(subset=['timestamp']).sort_values('timestamp', kind='stable')
 
 print(f"\nCSV time range (corrected): {data_filtered['timestamp'].min()} to {data_filtered['timestamp'].max()}")
 
@@ -80,6 +193,9 @@ with open(json_file, 'r', encoding='utf-8') as f:
 request_events = []
 if 'results' in benchmark_data:
     for entry in benchmark_data['results']:
+        # Cache hits never reached the server, so they have no power activity to mark
+        if entry.get('status') == 'cache_hit':
+            continue
         request_events.append({
             'timestamp_send': pd.to_datetime(entry['timestamp_send']),
             'timestamp_response': pd.to_datetime(entry['timestamp_response']),
@@ -102,24 +218,29 @@ if len(request_df) > 0:
     print(f"Last timestamp_response in JSON: {last_json_timestamp}")
     
     # Filter CSV data to show only from first request send to last response
-    data_filtered = data_filtered[
-        (data_filtered['timestamp'] >= first_json_timestamp) & 
-        (data_filtered['timestamp'] <= last_json_timestamp)
-    ].copy()
+    # On the sorted timestamps the window is a contiguous slice, located with two binary searches
+    csv_times = data_filtered['timestamp'].values
+    lo = np.searchsorted(csv_times, first_json_timestamp.to_datetime64(), side='left')
+    hi = np.searchsorted(csv_times, last_json_timestamp.to_datetime64(), side='right')
+    data_filtered = data_filtered.iloc[lo:hi].copy()
     print(f"CSV data filtered to {len(data_filtered)} rows (from first request to last response)")
     
-    # For each request, find the closest CSV measurement
-    request_df['csv_index'] = request_df['timestamp_send'].apply(
-        lambda req_time: (data_filtered['timestamp'] - req_time).abs().idxmin() 
-        if pd.notna(data_filtered['timestamp']).any() else None
-    )
+    # For each request, find the closest CSV measurement with a binary search over the CSV timestamps
+    ts = data_filtered['timestamp'].values.astype('datetime64[ns]')
+    req = request_df['timestamp_send'].values.astype('datetime64[ns]')
     
-    # Get the closest timestamp for each request
-    request_df['closest_csv_time'] = request_df['csv_index'].apply(
-        lambda idx: data_filtered.loc[idx, 'timestamp'] if idx is not None else None
-    )
-    
-    request_df['time_diff_seconds'] = (request_df['timestamp_send'] - request_df['closest_csv_time']).dt.total_seconds()
+    if len(ts) > 0:
+        chosen = nearest_indices(ts, req)
+        request_df['csv_index'] = data_filtered.index.values[chosen]
+        
+        # Get the closest timestamp for each request with a positional gather on the raw arrays
+        closest = ts[chosen]
+        request_df['closest_csv_time'] = closest
+        request_df['time_diff_seconds'] = (req - closest).astype('int64') / 1e9
+    else:
+        request_df['csv_index'] = None
+        request_df['closest_csv_time'] = pd.NaT
+        request_df['time_diff_seconds'] = np.nan
     
     print(f"\nTime difference statistics (seconds):")
     print(request_df['time_diff_seconds'].describe())
@@ -131,40 +252,4 @@ category_colors = {
     'long': 'red',
 }
 
-# Plot power metrics with request time bands
-for column in existing_columns:
-    plt.figure(figsize=(14, 6))
-    
-    # Plot power data vs timestamp
-    ax1 = plt.gca()
-    ax1.plot(data_filtered['timestamp'], data_filtered[column], label=column, color='blue', linewidth=1.5)
-    ax1.set_ylabel('Power (W)', color='blue', fontsize=12)
-    ax1.set_xlabel('Time', fontsize=12)
-    ax1.tick_params(axis='y', labelcolor='blue')
-    ax1.grid(True, alpha=0.3)
-    
-    # Add time bands for each request
-    if len(request_df) > 0:
-        # Track which categories have been added to legend
-        added_to_legend = set()
-        
-        for idx, row in request_df.iterrows():
-            category = row['size_category']
-            color = category_colors.get(category, 'lightgray')
-            label = f'{category.capitalize()} Request' if category not in added_to_legend else None
-            
-            # Draw vertical span from timestamp_send to timestamp_response
-            ax1.axvspan(row['timestamp_send'], row['timestamp_response'], 
-                       alpha=0.3, color=color, label=label)
-            
-            if label:
-                added_to_legend.add(category)
-    
-    plt.title(f'{column} with LLM Request Time Periods', fontsize=14, fontweight='bold')
-    ax1.legend(loc='lower left')
-    
-    # Format x-axis for better readability
-    plt.gcf().autofmt_xdate()
-    plt.tight_layout()
-
-plt.show()
\ No newline at end of file
+plot_power_metrics(data_filtered, request_df, existing_columns, category_colors)
\ No newline at end of file
@@ -5,9 +5,47 @@ y calcular los promedios de total_tokens separados por size_words
 """
 
 import json
+import mmap
 import os
 from pathlib import Path
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import ijson
+except ImportError:  # ijson es opcional; sin él se carga el JSON completo
+    ijson = None
+
+
+def _iter_results(f):
+    """Itera los registros de 'results' sin cargar el documento completo si ijson está disponible"""
+    if ijson is not None:
+        # use_float=True evita objetos Decimal para los campos numéricos
+        return ijson.items(f, 'results.item', use_float=True)
+    return iter(json.load(f).get('results', []))
+
+
+def _extract(json_file):
+    """Devuelve los pares (size_words, total_tokens) exitosos de un archivo y el error, si lo hubo"""
+    pairs = []
+    try:
+        # Abrir en binario: ijson decodifica UTF-8 por su cuenta
+        with open(json_file, 'rb') as f:
+            # Búsqueda rápida sobre los bytes: sin ningún "success" no hay nada que decodificar
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b'"success"') == -1:
+                    return pairs, None
+            
+            # Procesar cada resultado en streaming
+            for result in _iter_results(f):
+                if result.get('status') == 'success':
+                    size_words = result.get('size_words')
+                    total_tokens = result.get('total_tokens')
+                    
+                    if size_words is not None and total_tokens is not None:
+                        pairs.append((size_words, total_tokens))
+    except Exception as e:
+        return [], str(e)
+    return pairs, None
 
 
 def analyze_local_client_results():
@@ -21,8 +59,9 @@ def analyze_local_client_results():
         print(f"Error: La carpeta {local_client_dir} no existe")
         return
     
-    # Diccionario para almacenar tokens por size_words
-    tokens_by_size = defaultdict(list)
+    # Listas planas de pares (size_words, total_tokens); se agregan al final con pandas
+    sizes = []
+    tokens = []
     
     # Leer todos los archivos JSON en local_client
     json_files = list(local_client_dir.glob("*.json"))
@@ -33,59 +72,52 @@ def analyze_local_client_results():
     
     print(f"Analizando {len(json_files)} archivos JSON en local_client...\n")
     
-    # Procesar cada archivo JSON
-    for json_file in json_files:
-        print(f"Procesando: {json_file.name}")
-        
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+    # Procesar los archivos JSON en paralelo; map conserva el orden de json_files
+    with ProcessPoolExecutor() as executor:
+        for json_file, (pairs, error) in zip(json_files, executor.map(_extract, json_files, chunksize=4)):
+            print(f"Procesando: {json_file.name}")
             
-            # Extraer resultados
-            results = data.get('results', [])
+            if error is not None:
+                print(f"  Error al procesar {json_file.name}: {error}")
             
-            # Agrupar por size_words
-            for result in results:
-                if result.get('status') == 'success':
-                    size_words = result.get('size_words')
-                    total_tokens = result.get('total_tokens')
-                    
-                    if size_words is not None and total_tokens is not None:
-                        tokens_by_size[size_words].append(total_tokens)
-        
-        except Exception as e:
-            print(f"  Error al procesar {json_file.name}: {e}")
+            for size_words, total_tokens in pairs:
+                sizes.append(size_words)
+                tokens.append(total_tokens)
     
     # Calcular y mostrar promedios
     print("\n" + "="*60)
     print("PROMEDIOS DE TOTAL_TOKENS POR SIZE_WORDS")
     print("="*60)
     
-    if not tokens_by_size:
+    if not sizes:
         print("No se encontraron datos para calcular promedios")
         return
     
-    # Ordenar por size_words
-    for size_words in sorted(tokens_by_size.keys()):
-        tokens = tokens_by_size[size_words]
-        avg_tokens = sum(tokens) / len(tokens)
-        
-        print(f"\nSize Words: {size_words}")
-        print(f"  - Número de muestras: {len(tokens)}")
-        print(f"  - Promedio total_tokens: {avg_tokens:.2f}")
-        print(f"  - Mínimo: {min(tokens)}")
-        print(f"  - Máximo: {max(tokens)}")
+    # pandas se importa solo aquí: los procesos del pool no necesitan cargarlo
+    import pandas as pd
+    
+    # Una sola agregación agrupada, ordenada por size_words
+    df = pd.DataFrame({'size_words': sizes, 'total_tokens': tokens})
+    summary = df.groupby('size_words')['total_tokens'].agg(
+        samples='count', avg='mean', min_tokens='min', max_tokens='max'
+    ).sort_index()
+    
+    for row in summary.itertuples():
+        print(f"\nSize Words: {row.Index}")
+        print(f"  - Número de muestras: {row.samples}")
+        print(f"  - Promedio total_tokens: {row.avg:.2f}")
+        print(f"  - Mínimo: {row.min_tokens}")
+        print(f"  - Máximo: {row.max_tokens}")
     
     print("\n" + "="*60)
     
     # Resumen general
-    all_tokens = [token for tokens in tokens_by_size.values() for token in tokens]
-    if all_tokens:
-        print(f"\nRESUMEN GENERAL:")
-        print(f"  - Total de muestras: {len(all_tokens)}")
-        print(f"  - Promedio general: {sum(all_tokens) / len(all_tokens):.2f}")
-        print(f"  - Mínimo global: {min(all_tokens)}")
-        print(f"  - Máximo global: {max(all_tokens)}")
+    all_tokens = df['total_tokens']
+    print(f"\nRESUMEN GENERAL:")
+    print(f"  - Total de muestras: {len(all_tokens)}")
+    print(f"  - Promedio general: {all_tokens.mean():.2f}")
+    print(f"  - Mínimo global: {all_tokens.min()}")
+    print(f"  - Máximo global: {all_tokens.max()}")
 
 
 if __name__ == "__main__":
@@ -1,26 +1,91 @@
+import argparse
+import asyncio
+import copy
+import functools
+import hashlib
+import sqlite3
+import tempfile
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import orjson
 import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import os
+import random
 import yaml
 from lm_studio_manager import LMStudioManager
 
 
+class ResponseCache:
+    """SQLite store of successful request metrics, keyed by model, prompt and sampling parameters."""
+    
+    def __init__(self, db_path: str):
+        # send_request runs in worker threads, so the connection is shared behind a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, metrics TEXT NOT NULL)")
+        self._conn.commit()
+        # One lock per key, held while that request is in flight
+        self._key_locks = {}
+        
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        return hashlib.sha256(f"{model}|{prompt}|{temperature}|{max_tokens}".encode('utf-8')).hexdigest()
+    
+    def key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+    
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT metrics FROM responses WHERE key = ?", (key,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def set(self, key: str, metrics: Dict):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, metrics) VALUES (?, ?)",
+                               (key, orjson.dumps(metrics).decode('utf-8')))
+            self._conn.commit()
+            
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 class LMStudioClient:
     
-    def __init__(self, base_url: str = "http://localhost:1234/v1", model: str = None):
+    # Responses worth retrying: rate limiting and transient server-side failures
+    RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+    
+    def __init__(self, base_url: str = "http://localhost:1234/v1", model: str = None, pool_size: int = 4,
+                 cache: Optional[ResponseCache] = None, max_retries: int = 3, retry_backoff: float = 0.5):
         self.base_url = base_url.rstrip('/')
         self.chat_endpoint = f"{self.base_url}/chat/completions"
         self.models_endpoint = f"{self.base_url}/models"
+        self.cache = cache
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        
+        # Persistent session: keep-alive connections are reused across requests
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
         self.model = model or self._get_available_model()
         
+    def close(self):
+        self.session.close()
+        
     def _get_available_model(self) -> str:
         try:
-            response = requests.get(self.models_endpoint, timeout=5)
+            response = self.session.get(self.models_endpoint, timeout=5)
             response.raise_for_status()
-            models = response.json().get('data', [])
+            models = orjson.loads(response.content).get('data', [])
             if models:
                 model_name = models[0]['id']
                 print(f"Model detected: {model_name}")
@@ -32,9 +97,43 @@ class LMStudioClient:
             print(f"Error detecting model: {e}. Using 'local-model' as fallback.")
             return "local-model"
     
-    def send_request(self, prompt: str, max_tokens: int = 100, temperature: float = 0.7) -> Dict:
-        start_time = time.time()
-        timestamp_send = datetime.now().isoformat()
+    @staticmethod
+    def _clock() -> tuple:
+        # Monotonic counter for elapsed math, wall clock only for the ISO timestamps
+        return time.perf_counter_ns(), datetime.now()
+    
+    @staticmethod
+    def _timing(start: tuple, end: tuple) -> Dict:
+        return {
+            "timestamp_send": start[1].isoformat(),
+            "timestamp_response": end[1].isoformat(),
+            "elapsed_time_seconds": round((end[0] - start[0]) / 1e9, 3),
+        }
+    
+    def _build_metrics(self, status: str, prompt: str, prompt_len: int, max_tokens: int, temperature: float,
+                       start: tuple, end: tuple, response_text: Optional[str] = None,
+                       usage: Optional[Dict] = None, attempts: int = 1) -> Dict:
+        usage = usage or {}
+        return {
+            **self._timing(start, end),
+            "prompt": prompt,
+            "response": response_text,
+            "prompt_length_chars": prompt_len,
+            "response_length_chars": len(response_text) if response_text is not None else 0,
+            "prompt_tokens": usage.get('prompt_tokens', None),
+            "completion_tokens": usage.get('completion_tokens', None),
+            "total_tokens": usage.get('total_tokens', None),
+            "max_tokens_requested": max_tokens,
+            "temperature": temperature,
+            "model": self.model,
+            "status": status,
+            "attempts": attempts
+        }
+    
+    def send_request(self, prompt: str, max_tokens: int = 100, temperature: float = 0.7,
+                     prompt_len: Optional[int] = None) -> Dict:
+        if prompt_len is None:
+            prompt_len = len(prompt)
         
         payload = {
             "model": self.model,
@@ -46,90 +145,88 @@ class LMStudioClient:
             "stream": False
         }
         
-        try:
-            response = requests.post(
-                self.chat_endpoint,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=300
-            )
-            response.raise_for_status()
-            
-            end_time = time.time()
-            timestamp_response = datetime.now().isoformat()
-            elapsed_time = end_time - start_time
-            
-            response_data = response.json()
-            response_text = response_data['choices'][0]['message']['content']
-            
-            usage = response_data.get('usage', {})
-            
-            metrics = {
-                "timestamp_send": timestamp_send,
-                "timestamp_response": timestamp_response,
-                "elapsed_time_seconds": round(elapsed_time, 3),
-                "prompt": prompt,
-                "response": response_text,
-                "prompt_length_chars": len(prompt),
-                "response_length_chars": len(response_text),
-                "prompt_tokens": usage.get('prompt_tokens', None),
-                "completion_tokens": usage.get('completion_tokens', None),
-                "total_tokens": usage.get('total_tokens', None),
-                "max_tokens_requested": max_tokens,
-                "temperature": temperature,
-                "model": self.model,
-                "status": "success"
-            }
-            
-            print(f"✅ {elapsed_time:.2f}s")
-            return metrics
-            
-        except requests.exceptions.Timeout:
-            metrics = {
-                "timestamp_send": timestamp_send,
-                "timestamp_response": datetime.now().isoformat(),
-                "elapsed_time_seconds": time.time() - start_time,
-                "prompt": prompt,
-                "response": None,
-                "prompt_length_chars": len(prompt),
-                "response_length_chars": 0,
-                "prompt_tokens": None,
-                "completion_tokens": None,
-                "total_tokens": None,
-                "max_tokens_requested": max_tokens,
-                "temperature": temperature,
-                "model": self.model,
-                "status": "timeout"
-            }
-            print(f"⏱️ Timeout")
-            return metrics
+        if self.cache is None:
+            return self._post(payload, prompt, prompt_len, max_tokens, temperature)
+        
+        # Identical requests are answered from the cache when one is configured (never in a normal benchmark run).
+        # Concurrent requests for the same key wait for the one in flight and are then answered from its response.
+        cache_key = ResponseCache.make_key(self.model, prompt, temperature, max_tokens)
+        with self.cache.key_lock(cache_key):
+            start = self._clock()
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                end = self._clock()
+                print(f"💾 Cache hit")
+                return {
+                    **cached,
+                    **self._timing(start, end),
+                    "status": "cache_hit",
+                    "attempts": 0  # nothing was sent to the server
+                }
             
-        except Exception as e:
-            metrics = {
-                "timestamp_send": timestamp_send,
-                "timestamp_response": datetime.now().isoformat(),
-                "elapsed_time_seconds": time.time() - start_time,
-                "prompt": prompt,
-                "response": None,
-                "prompt_length_chars": len(prompt),
-                "response_length_chars": 0,
-                "prompt_tokens": None,
-                "completion_tokens": None,
-                "total_tokens": None,
-                "max_tokens_requested": max_tokens,
-                "temperature": temperature,
-                "model": self.model,
-                "status": f"error: {str(e)}"
-            }
-            print(f"❌ Error")
+            metrics = self._post(payload, prompt, prompt_len, max_tokens, temperature)
+            if metrics['status'] == 'success':
+                self.cache.set(cache_key, metrics)
             return metrics
+    
+    def _post(self, payload: Dict, prompt: str, prompt_len: int, max_tokens: int, temperature: float) -> Dict:
+        # Connection failures and retryable HTTP statuses are retried with exponential backoff and jitter;
+        # timeouts are recorded as they are. Timestamps describe the final attempt.
+        for attempt in range(1, self.max_retries + 2):
+            start = self._clock()
+            try:
+                response = self.session.post(
+                    self.chat_endpoint,
+                    data=orjson.dumps(payload),  # Content-Type is set on the session
+                    timeout=300
+                )
+                response.raise_for_status()
+                
+                end = self._clock()
+                
+                response_data = orjson.loads(response.content)
+                response_text = response_data['choices'][0]['message']['content']
+                
+                usage = response_data.get('usage', {})
+                
+                metrics = self._build_metrics("success", prompt, prompt_len, max_tokens, temperature,
+                                              start, end, response_text=response_text, usage=usage,
+                                              attempts=attempt)
+                
+                print(f"✅ {(end[0] - start[0]) / 1e9:.2f}s")
+                return metrics
+                
+            except requests.exceptions.Timeout:
+                print(f"⏱️ Timeout")
+                return self._build_metrics("timeout", prompt, prompt_len, max_tokens, temperature,
+                                           start, self._clock(), attempts=attempt)
+                
+            except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
+                end = self._clock()
+                retryable = (isinstance(e, requests.exceptions.ConnectionError)
+                             or e.response.status_code in self.RETRY_STATUS_CODES)
+                if not retryable or attempt > self.max_retries:
+                    print(f"❌ Error")
+                    return self._build_metrics(f"error: {str(e)}", prompt, prompt_len, max_tokens, temperature,
+                                               start, end, attempts=attempt)
+                
+                wait = self.retry_backoff * 2 ** (attempt - 1) + random.uniform(0, 0.1)
+                print(f"🔁 Retry {attempt}/{self.max_retries} in {wait:.2f}s... ", end="")
+                time.sleep(wait)  # runs in a worker thread, so the event loop is not blocked
+                
+            except Exception as e:
+                print(f"❌ Error")
+                return self._build_metrics(f"error: {str(e)}", prompt, prompt_len, max_tokens, temperature,
+                                           start, self._clock(), attempts=attempt)
 
 
 class BenchmarkDatabase:
     
-    def __init__(self, output_dir: str = "./benchmark_results", filename: str = None):
+    def __init__(self, output_dir: str = "./benchmark_results", filename: str = None, ensure_dir: bool = True):
         self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
+        # Callers that create output_dir once up front pass ensure_dir=False
+        if ensure_dir:
+            os.makedirs(output_dir, exist_ok=True)
         
         if filename:
             self.json_file = os.path.join(output_dir, filename)
@@ -137,60 +234,105 @@ class BenchmarkDatabase:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             self.json_file = os.path.join(output_dir, f"benchmark_{timestamp}.json")
         
-        self.results: List[Dict] = []
+        # Results are streamed to a JSONL file, one line per result, flushed as it arrives;
+        # only running aggregates for the summary are kept in memory
+        self.jsonl_file = os.path.splitext(self.json_file)[0] + ".jsonl"
+        self._jsonl = open(self.jsonl_file, 'wb')
+        
+        self.total_requests = 0
+        self.successful = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self._sum_elapsed = 0.0
+        self._sum_prompt_len = 0
+        self._sum_response_len = 0
+        self._sum_tokens = 0
+        self._with_tokens = 0
         
     def add_result(self, metrics: Dict):
-        self.results.append(metrics)
+        self._jsonl.write(orjson.dumps(metrics, option=orjson.OPT_APPEND_NEWLINE))
+        self._jsonl.flush()
+        
+        self.total_requests += 1
+        status = metrics.get('status')
+        if status == 'success':
+            self.successful += 1
+            self._sum_elapsed += metrics['elapsed_time_seconds']
+            self._sum_prompt_len += metrics['prompt_length_chars']
+            self._sum_response_len += metrics['response_length_chars']
+            if metrics.get('total_tokens') is not None:
+                self._sum_tokens += metrics['total_tokens']
+                self._with_tokens += 1
+        elif status == 'cache_hit':
+            self.cache_hits += 1
+        else:
+            self.failed += 1
+            if status == 'timeout':
+                self.timeouts += 1
         
     def save_json(self):
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "metadata": {
-                    "total_requests": len(self.results),
-                    "generated_at": datetime.now().isoformat()
-                },
-                "results": self.results
-            }, f, indent=2, ensure_ascii=False)
+        # Combined document read by the analysis scripts; results are copied over from the JSONL file
+        # one at a time, producing the same layout as dumping the whole list with a 2-space indent
+        self._jsonl.flush()
+        metadata = orjson.dumps({
+            "total_requests": self.total_requests,
+            "generated_at": datetime.now().isoformat()
+        }, option=orjson.OPT_INDENT_2)
+        
+        with open(self.json_file, 'wb') as f, open(self.jsonl_file, 'rb') as results:
+            f.write(b'{\n  "metadata": ' + metadata.replace(b'\n', b'\n  ') + b',\n  "results": [')
+            separator = b'\n    '
+            for line in results:
+                result = orjson.dumps(orjson.loads(line), option=orjson.OPT_INDENT_2)
+                f.write(separator + result.replace(b'\n', b'\n    '))
+                separator = b',\n    '
+            f.write(b']\n}' if separator == b'\n    ' else b'\n  ]\n}')
         
     def save_all(self):
         self.save_json()
+        self.close()
+        
+    def close(self):
+        # Results already written to the JSONL file survive an interrupted run
+        self._jsonl.close()
         
     def print_summary(self):
-        if not self.results:
+        if not self.total_requests:
             print("No results to display.")
             return
-            
-        successful = [r for r in self.results if r['status'] == 'success']
-        failed = [r for r in self.results if r.get('status') != 'success']
-        timeouts = [r for r in self.results if r.get('status') == 'timeout']
         
         print("\n" + "="*60)
         print("BENCHMARK SUMMARY")
         print("="*60)
-        print(f"Total requests: {len(self.results)}")
-        print(f"Successful: {len(successful)}")
-        print(f"Failed: {len(failed)}")
-        if timeouts:
-            print(f"Timeouts: {len(timeouts)}")
-
-        if successful:
-            avg_time = sum(r['elapsed_time_seconds'] for r in successful) / len(successful)
-            avg_prompt_len = sum(r['prompt_length_chars'] for r in successful) / len(successful)
-            avg_response_len = sum(r['response_length_chars'] for r in successful) / len(successful)
-
-            print(f"Average response time: {avg_time:.2f}s")
-            print(f"Average prompt length: {avg_prompt_len:.0f} characters")
-            print(f"Average response length: {avg_response_len:.0f} characters")
-
-            tokens_available = [r for r in successful if r.get('total_tokens') is not None]
-            if tokens_available:
-                avg_tokens = sum(r['total_tokens'] for r in tokens_available) / len(tokens_available)
-                print(f"Average total tokens: {avg_tokens:.0f}")
+        print(f"Total requests: {self.total_requests}")
+        print(f"Successful: {self.successful}")
+        print(f"Failed: {self.failed}")
+        if self.timeouts:
+            print(f"Timeouts: {self.timeouts}")
+        if self.cache_hits:
+            print(f"Cache hits: {self.cache_hits}")
+
+        if self.successful:
+            print(f"Average response time: {self._sum_elapsed / self.successful:.2f}s")
+            print(f"Average prompt length: {self._sum_prompt_len / self.successful:.0f} characters")
+            print(f"Average response length: {self._sum_response_len / self.successful:.0f} characters")
+
+            if self._with_tokens:
+                print(f"Average total tokens: {self._sum_tokens / self._with_tokens:.0f}")
         
         print("="*60 + "\n")
 
 
-def load_config(config_file: str = "prompts_config.json") -> Dict:
+# Characters in model IDs that are not safe in result file names
+_SAFE_TABLE = str.maketrans({'/': '_', ' ': '_'})
+
+# libyaml-backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _resolve_config(config_file: str) -> str:
+    """Find a config file in the working directory, falling back to this script's directory."""
     if not os.path.exists(config_file):
         candidate = os.path.join(os.path.dirname(__file__), config_file)
         if os.path.exists(candidate):
@@ -198,28 +340,317 @@ def load_config(config_file: str = "prompts_config.json") -> Dict:
         else:
             raise FileNotFoundError(f"Configuration file not found: {config_file}")
     
-    with open(config_file, 'r', encoding='utf-8') as f:
-        config = json.load(f)
-    
-    return config
+    return os.path.abspath(config_file)
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_config(path: str, mtime: float, fmt: str) -> Dict:
+    # mtime is part of the key so an edited file is parsed again
+    with open(path, 'rb') as f:
+        if fmt == 'json':
+            return json.load(f)
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+
+def _load_config_file(config_file: str, fmt: str) -> Dict:
+    path = _resolve_config(config_file)
+    # Callers get their own copy of the memoized config
+    return copy.deepcopy(_parse_config(path, os.path.getmtime(path), fmt))
+
+
+def load_config(config_file: str = "prompts_config.json") -> Dict:
+    return _load_config_file(config_file, 'json')
 
 
 def load_experiments_config(config_file: str = "experiments.yaml") -> Dict:
     """Load the experiments configuration from YAML file."""
-    if not os.path.exists(config_file):
-        candidate = os.path.join(os.path.dirname(__file__), config_file)
-        if os.path.exists(candidate):
-            config_file = candidate
+    return _load_config_file(config_file, 'yaml')
+
+
+def build_queries(template: str, topics: List[str], sizes_dict: Dict[str, int], repetitions: int) -> List[tuple]:
+    """Expand the experiment grid into (topic, size_name, size_value, rep, prompt, prompt_len) queries."""
+    # Each prompt is formatted once per (topic, size) and shared by its repetitions and by every model
+    prompts = {
+        (topic, size_name): template.format(size=size_value, topic=topic)
+        for topic in topics
+        for size_name, size_value in sizes_dict.items()
+    }
+    prompt_lens = {key: len(prompt) for key, prompt in prompts.items()}
+    
+    return [
+        (topic, size_name, size_value, rep, prompts[topic, size_name], prompt_lens[topic, size_name])
+        for topic in topics
+        for size_name, size_value in sizes_dict.items()
+        for rep in range(1, repetitions + 1)
+    ]
+
+
+def find_missing_models(models: List[str], managers: Dict[str, LMStudioManager]) -> Dict[str, List[str]]:
+    """Map each model to the endpoints whose /models listing does not include it."""
+    missing = {}
+    for endpoint, manager in managers.items():
+        available = {model['id'] for model in manager.get_models_cached()}
+        # An empty listing means the endpoint could not be queried, not that every model is missing
+        if not available:
+            continue
+        for model_name in models:
+            if model_name not in available:
+                missing.setdefault(model_name, []).append(endpoint)
+    return missing
+
+
+def validate_experiment(template: str, topics: List[str], sizes_dict: Dict[str, int], models: List[str],
+                        managers: Dict[str, LMStudioManager], output_dir: str, concurrency: int = 1,
+                        max_retries: int = 3, rate_qps: Optional[float] = None) -> List[str]:
+    """Check the whole sweep before it starts; returns a list of problems (empty if it can run)."""
+    problems = []
+    
+    def is_int(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+    
+    # Settings: a bad value here would only fail (or hang the rate limiter) once a model is loaded
+    if not is_int(concurrency) or concurrency < 1:
+        problems.append(f"'concurrency' must be a positive integer, got {concurrency!r}")
+    if not is_int(max_retries) or max_retries < 0:
+        problems.append(f"'max_retries' must be an integer >= 0, got {max_retries!r}")
+    if rate_qps is not None and (not isinstance(rate_qps, (int, float)) or isinstance(rate_qps, bool)
+                                 or not rate_qps > 0):
+        problems.append(f"'rate_qps' must be a positive number or unset, got {rate_qps!r}")
+    
+    if not isinstance(template, str):
+        problems.append("'template' must be a string")
+    else:
+        for topic in topics:
+            for size_name, size_value in sizes_dict.items():
+                try:
+                    template.format(size=size_value, topic=topic)
+                except (KeyError, IndexError, ValueError) as e:
+                    problems.append(f"template cannot be formatted for {topic!r}/{size_name}: {e!r}")
+    
+    for size_name, size_value in sizes_dict.items():
+        if not is_int(size_value) or size_value <= 0:
+            problems.append(f"size {size_name!r} must be a positive integer, got {size_value!r}")
+    
+    # Only a model that no endpoint can serve is a problem; the scheduler skips endpoints lacking a model
+    listed = [endpoint for endpoint, manager in managers.items() if manager.get_models_cached()]
+    for model_name, endpoints in find_missing_models(models, managers).items():
+        if len(endpoints) == len(listed):
+            problems.append(f"model {model_name} is not available at any endpoint ({', '.join(endpoints)})")
+    
+    try:
+        with tempfile.TemporaryFile(dir=output_dir):
+            pass
+    except OSError as e:
+        problems.append(f"output directory {output_dir!r} is not writable: {e}")
+    
+    return problems
+
+
+def _run_in_daemon_thread(func: Callable, *args, **kwargs) -> asyncio.Future:
+    """Run a blocking call in a daemon thread and return a future for its result.
+    
+    Executor threads are joined when the interpreter exits, so Ctrl-C would wait for every in-flight
+    request (up to its 300 s timeout); closing a requests.Session does not interrupt them either.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def resolve(result, error):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(result)
         else:
-            raise FileNotFoundError(f"Configuration file not found: {config_file}")
+            future.set_exception(error)
+    
+    def worker():
+        result = error = None
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            pass  # the event loop is already closed: the run was interrupted
+    
+    threading.Thread(target=worker, daemon=True).start()
+    return future
+
+
+class TokenBucket:
+    """Async token bucket: refills at `rate` tokens per second and holds at most `burst` tokens."""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        if not rate > 0:
+            raise ValueError(f"rate must be positive, got {rate!r}")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def run_benchmark_queries(client: LMStudioClient, db: BenchmarkDatabase, queries: List[tuple],
+                                concurrency: int = 1, delay: float = 0.0, inline: Optional[bool] = None,
+                                rate_qps: Optional[float] = None, bucket: Optional[TokenBucket] = None):
+    """Send every query from build_queries(), with at most `concurrency` in flight."""
+    # Pacing: a fixed `delay` after each response, or a token bucket starting requests at `rate_qps`
+    # (pass `bucket` to share one rate across several concurrent calls)
+    if inline is None:
+        inline = concurrency == 1
+    if bucket is None and rate_qps:
+        bucket = TokenBucket(rate_qps)
+    semaphore = asyncio.Semaphore(concurrency)
+    total_queries = len(queries)
+    
+    async def run_query(query_idx, topic, size_name, size_value, rep, prompt, prompt_len):
+        async with semaphore:
+            if bucket is not None:
+                await bucket.acquire()
+            
+            # With several requests in flight, status lines would otherwise interleave with this prefix
+            print(f"    [{query_idx}/{total_queries}] {topic} | {size_name} ({size_value} words) | Rep {rep}... ",
+                  end="" if inline else "\n")
+            
+            # send_request is blocking; each call runs in its own daemon thread (at most `concurrency`
+            # at once, bounded by the semaphore) and records its own timestamps
+            metrics = await _run_in_daemon_thread(
+                client.send_request,
+                prompt=prompt,
+                max_tokens=size_value * 2,  # Approximate: 2 tokens per word
+                temperature=0.7,
+                prompt_len=prompt_len
+            )
+            
+            # Add experiment metadata
+            metrics['topic'] = topic
+            metrics['size_category'] = size_name
+            metrics['size_words'] = size_value
+            metrics['repetition'] = rep
+            
+            db.add_result(metrics)
+            
+            if bucket is None and query_idx < total_queries:
+                await asyncio.sleep(delay)
+    
+    await asyncio.gather(*(run_query(idx, *query) for idx, query in enumerate(queries, 1)))
+
+
+async def run_models(managers: Dict[str, LMStudioManager], models: List[str], queries: List[tuple],
+                     output_dir: str, timestamp: str, concurrency: int = 1, delay: float = 0.0,
+                     cache: Optional[ResponseCache] = None, max_retries: int = 3,
+                     rate_qps: Optional[float] = None, unavailable: Optional[Dict[str, List[str]]] = None):
+    """Benchmark every model, each endpoint in `managers` working through the shared model queue."""
+    # Pending models as [model_idx, model_name, endpoints that failed to load it]; a model that fails to
+    # load goes back to the queue for the endpoints that have not tried it yet
+    # Endpoints listed in `unavailable` for a model count as having already failed to load it
+    unavailable = unavailable or {}
+    pending = [[model_idx, model_name, set(unavailable.get(model_name, ()))]
+               for model_idx, model_name in enumerate(models, 1)]
+    skipped = {}
+    busy = set()
+    # One bucket for the whole run, so rate_qps is the total rate across all endpoints
+    bucket = TokenBucket(rate_qps) if rate_qps else None
+    changed = asyncio.Condition()
+    
+    def next_model(endpoint):
+        for i, item in enumerate(pending):
+            if endpoint not in item[2]:
+                return pending.pop(i)
+        return None
+    
+    async def benchmark_model(endpoint, manager, model_idx, model_name) -> bool:
+        print("\n" + "="*60)
+        print(f"MODEL {model_idx}/{len(models)}: {model_name}")
+        print("="*60)
+        
+        # Load the model
+        print(f"\n🔄 Loading model: {model_name} ({endpoint})")
+        if not await _run_in_daemon_thread(manager.load_model, model_name):
+            return False
+        
+        # Create database for this model
+        model_safe_name = model_name.translate(_SAFE_TABLE)
+        filename = f"benchmark_{model_safe_name}_{timestamp}.json"
+        db = BenchmarkDatabase(output_dir=output_dir, filename=filename, ensure_dir=False)
+        try:
+            # Create client with this model
+            client = LMStudioClient(base_url=endpoint, model=model_name, pool_size=concurrency, cache=cache,
+                                    max_retries=max_retries)
+            
+            print(f"\n🚀 Starting benchmark for {model_name}...")
+            print("-" * 60)
+            
+            try:
+                await run_benchmark_queries(client, db, queries, concurrency=concurrency, delay=delay,
+                                            inline=concurrency == 1 and len(managers) == 1, bucket=bucket)
+            finally:
+                client.close()
+            
+            print("\n" + "-" * 60)
+            print(f"✅ Completed benchmark for model: {model_name}")
+            
+            # Save results for this model
+            print(f"💾 Saving results to: {db.json_file}")
+            await asyncio.to_thread(db.save_all)
+            db.print_summary()
+        finally:
+            db.close()
+        return True
     
-    with open(config_file, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    async def endpoint_worker(endpoint, manager):
+        while True:
+            # Idle workers wait while others are busy, since a failed load may hand them a model
+            async with changed:
+                await changed.wait_for(lambda: not busy or any(endpoint not in item[2] for item in pending))
+                item = next_model(endpoint)
+                if item is None:
+                    return
+                busy.add(endpoint)
+            
+            model_idx, model_name, failed_on = item
+            loaded = None  # stays None if the benchmark raised
+            try:
+                loaded = await benchmark_model(endpoint, manager, model_idx, model_name)
+            finally:
+                async with changed:
+                    busy.discard(endpoint)
+                    if loaded is False:
+                        failed_on.add(endpoint)
+                        if len(failed_on) < len(managers):
+                            print(f"❌ Failed to load model {model_name} on {endpoint}. Trying another endpoint...")
+                            pending.append(item)
+                        else:
+                            print(f"❌ Failed to load model {model_name}. Skipping...")
+                            skipped[model_name] = sorted(failed_on)
+                    changed.notify_all()
+            
+            # Small delay before loading next model
+            if loaded and pending:
+                print("\n⏳ Waiting before loading next model...")
+                await asyncio.sleep(5)
     
-    return config
+    await asyncio.gather(*(endpoint_worker(endpoint, manager) for endpoint, manager in managers.items()))
+    
+    if skipped:
+        print("\n⚠️ Models skipped because they could not be loaded:")
+        for model_name, endpoints in skipped.items():
+            print(f"   - {model_name} (tried: {', '.join(endpoints)})")
 
 
-def main():
+def main(use_cache: bool = False, cache_file: Optional[str] = None):
     print("\n" + "="*60)
     print("LLM STUDIO BENCHMARK TOOL - EXPERIMENTS MODE")
     print("="*60 + "\n")
@@ -237,6 +668,9 @@ def main():
     lm_studio_url = settings.get('lm_studio_url', 'http://localhost:1234/v1')
     output_dir = settings.get('output_directory', './benchmark_results')
     delay = settings.get('delay_between_requests', 1.0)
+    concurrency = settings.get('concurrency', 1)
+    max_retries = settings.get('max_retries', 3)
+    rate_qps = settings.get('rate_qps')  # when set, replaces delay_between_requests
     
     # Extract experiment parameters
     repetitions = experiments_config.get('repetitions', 5)
@@ -256,89 +690,69 @@ def main():
     print(f"  - Topics: {len(topics)}")
     print(f"  - Sizes: {list(sizes_dict.keys())}")
     print(f"  - Repetitions per query: {repetitions}")
+    print(f"  - Concurrent requests: {concurrency}")
+    if rate_qps:
+        print(f"  - Request rate: {rate_qps} req/s (total across endpoints)")
     print(f"\nTotal queries per model: {len(topics) * len(sizes_dict) * repetitions}")
     print(f"Total queries overall: {len(models) * len(topics) * len(sizes_dict) * repetitions}\n")
     
-    # Initialize LM Studio Manager
-    base_url = lm_studio_url.replace('/v1', '')
-    manager = LMStudioManager(base_url=base_url)
+    # Created once here; the per-model databases write into it without checking again
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # One worker per LM Studio endpoint; models are handed out to whichever endpoint is free
+    endpoints = experiments_config.get('endpoints') or [lm_studio_url]
+    managers = {}
+    for endpoint in endpoints:
+        manager = LMStudioManager(base_url=endpoint.replace('/v1', ''))
+        if manager.check_server():
+            managers[endpoint] = manager
+        else:
+            print(f"⚠️ Cannot connect to LM Studio server at {endpoint}. Skipping endpoint...")
+            manager.close()
     
-    if not manager.check_server():
+    if not managers:
         print("❌ Cannot connect to LM Studio server. Make sure it's running.")
         return
     
+    if len(endpoints) > 1:
+        print(f"🖧 Scheduling models across {len(managers)} endpoint(s): {', '.join(managers)}")
+    
+    # Fail now rather than hours into the sweep
+    problems = validate_experiment(template, topics, sizes_dict, models, managers, output_dir,
+                                   concurrency=concurrency, max_retries=max_retries, rate_qps=rate_qps)
+    if problems:
+        print("❌ Invalid experiment configuration:")
+        for problem in problems:
+            print(f"   - {problem}")
+        for manager in managers.values():
+            manager.close()
+        return
+    
+    # Models that only some endpoints have are scheduled on those endpoints only
+    unavailable = find_missing_models(models, managers)
+    for model_name, endpoints in unavailable.items():
+        print(f"⚠️ Model {model_name} is not available at {', '.join(endpoints)}; it will run elsewhere")
+    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Process each model
-    for model_idx, model_name in enumerate(models, 1):
-        print("\n" + "="*60)
-        print(f"MODEL {model_idx}/{len(models)}: {model_name}")
-        print("="*60)
-        
-        # Load the model
-        print(f"\n🔄 Loading model: {model_name}")
-        if not manager.load_model(model_name):
-            print(f"❌ Failed to load model {model_name}. Skipping...")
-            continue
-        
-        # Create database for this model
-        model_safe_name = model_name.replace('/', '_').replace(' ', '_')
-        filename = f"benchmark_{model_safe_name}_{timestamp}.json"
-        db = BenchmarkDatabase(output_dir=output_dir, filename=filename)
-        
-        # Create client with this model
-        client = LMStudioClient(base_url=lm_studio_url, model=model_name)
-        
-        total_queries = len(topics) * len(sizes_dict) * repetitions
-        query_count = 0
-        
-        print(f"\n🚀 Starting benchmark for {model_name}...")
-        print("-" * 60)
-        
-        # For each topic
-        for topic_idx, topic in enumerate(topics, 1):
-            print(f"\n📌 Topic {topic_idx}/{len(topics)}: {topic}")
-            
-            # For each size
-            for size_name, size_value in sizes_dict.items():
-                prompt = template.format(size=size_value, topic=topic)
-                
-                print(f"  📊 Size: {size_name} ({size_value} words)")
-                
-                # Repeat N times
-                for rep in range(1, repetitions + 1):
-                    query_count += 1
-                    print(f"    [{query_count}/{total_queries}] Rep {rep}/{repetitions}... ", end="")
-                    
-                    metrics = client.send_request(
-                        prompt=prompt,
-                        max_tokens=size_value * 2,  # Approximate: 2 tokens per word
-                        temperature=0.7
-                    )
-                    
-                    # Add experiment metadata
-                    metrics['topic'] = topic
-                    metrics['size_category'] = size_name
-                    metrics['size_words'] = size_value
-                    metrics['repetition'] = rep
-                    
-                    db.add_result(metrics)
-                    
-                    if query_count < total_queries:
-                        time.sleep(delay)
-        
-        print("\n" + "-" * 60)
-        print(f"✅ Completed benchmark for model: {model_name}")
-        
-        # Save results for this model
-        print(f"💾 Saving results to: {db.json_file}")
-        db.save_all()
-        db.print_summary()
-        
-        # Small delay before loading next model
-        if model_idx < len(models):
-            print("\n⏳ Waiting before loading next model...")
-            time.sleep(5)
+    # Same queries (and prompt strings) for every model
+    queries = build_queries(template, topics, sizes_dict, repetitions)
+    
+    # Optional response cache for dry runs: cached metrics are not real measurements
+    cache = None
+    if use_cache:
+        cache = ResponseCache(cache_file or os.path.join(output_dir, "response_cache.sqlite"))
+        print(f"💾 Response cache enabled: identical requests are answered from the cache")
+    
+    try:
+        asyncio.run(run_models(managers, models, queries, output_dir, timestamp,
+                               concurrency=concurrency, delay=delay, cache=cache, max_retries=max_retries,
+                               rate_qps=rate_qps, unavailable=unavailable))
+    finally:
+        for manager in managers.values():
+            manager.close()
+        if cache is not None:
+            cache.close()
     
     print("\n" + "="*60)
     print("🎉 ALL EXPERIMENTS COMPLETED!")
@@ -346,8 +760,21 @@ def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='LM Studio benchmark tool')
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='Answer repeated identical requests from a local response cache (dry runs only)'
+    )
+    parser.add_argument(
+        '--cache-file',
+        metavar='PATH',
+        help='SQLite file for the response cache (default: <output_directory>/response_cache.sqlite)'
+    )
+    args = parser.parse_args()
+    
     try:
-        main()
+        main(use_cache=args.cache, cache_file=args.cache_file)
     except KeyboardInterrupt:
         print("\n\nBenchmark interrupted by user.")
     except Exception as e:
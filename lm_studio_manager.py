@@ -24,6 +24,14 @@ class LMStudioManager:
         self.base_url = base_url.rstrip('/')
         self.api_base = f"{self.base_url}/v1"
         self.models_endpoint = f"{self.api_base}/models"
+        # Reuse keep-alive connections for the status, listing and load requests
+        self.session = requests.Session()
+        self._models_cache = None
+        self._models_cache_time = 0.0
+        
+    def close(self):
+        """Close the pooled HTTP connections."""
+        self.session.close()
         
     def check_server(self) -> bool:
         """
@@ -33,8 +41,15 @@ class LMStudioManager:
             True if the server responds, False otherwise
         """
         try:
-            response = requests.get(self.models_endpoint, timeout=5)
-            return response.status_code == 200
+            response = self.session.get(self.models_endpoint, timeout=5)
+            if response.status_code != 200:
+                return False
+            # The listing fetched for the check also primes get_models_cached()
+            try:
+                self._remember_models(response.json().get('data', []))
+            except ValueError:
+                pass
+            return True
         except requests.exceptions.RequestException as e:
             print(f"❌ Error: Cannot connect to LM Studio at {self.base_url}")
             print(f"   Details: {e}")
@@ -48,7 +63,7 @@ class LMStudioManager:
             List of dictionaries with model information
         """
         try:
-            response = requests.get(self.models_endpoint, timeout=10)
+            response = self.session.get(self.models_endpoint, timeout=10)
             response.raise_for_status()
             data = response.json()
             models = data.get('data', [])
@@ -57,6 +72,29 @@ class LMStudioManager:
             print(f"❌ Error listing models: {e}")
             return []
     
+    def get_models_cached(self, ttl: float = 5.0) -> List[Dict]:
+        """
+        List available models, reusing the previous listing if it is recent.
+        
+        Args:
+            ttl: Maximum age in seconds of a reused listing
+            
+        Returns:
+            List of dictionaries with model information
+        """
+        if self._models_cache is None or time.monotonic() - self._models_cache_time > ttl:
+            models = self.list_models()
+            # Failed listings are not cached
+            if not models:
+                return models
+            self._remember_models(models)
+        return self._models_cache
+    
+    def _remember_models(self, models: List[Dict]):
+        if models:
+            self._models_cache = models
+            self._models_cache_time = time.monotonic()
+    
     def get_loaded_model(self) -> Optional[str]:
         """
         Get the model currently loaded in memory.
@@ -85,6 +123,7 @@ class LMStudioManager:
             True if the model was loaded successfully
         """
         print(f"🔄 Attempting to load model: {model_path}")
+        deadline = time.monotonic() + timeout
         
         chat_endpoint = f"{self.api_base}/chat/completions"
         payload = {
@@ -95,20 +134,28 @@ class LMStudioManager:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 chat_endpoint,
                 json=payload,
                 timeout=timeout
             )
             response.raise_for_status()
             
-            # Verify that the model is loaded
-            time.sleep(2)  # Give time for loading to complete
+            # Verify that the requested model is the loaded one, polling with backoff
+            # (50 ms doubling up to 1.6 s) until it appears or the timeout runs out
             loaded = self.get_loaded_model()
+            delay = 0.05
+            while loaded != model_path and time.monotonic() < deadline:
+                time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                delay = min(delay * 2, 1.6)
+                loaded = self.get_loaded_model()
             
-            if loaded:
+            if loaded == model_path:
                 print(f"✅ Model loaded successfully: {loaded}")
                 return True
+            elif loaded:
+                print(f"⚠️  Warning: Expected {model_path} to be loaded, but the server reports {loaded}")
+                return False
             else:
                 print(f"⚠️  Warning: The model may not have loaded correctly")
                 return False
@@ -5,13 +5,16 @@ Ejecuta solo 1 repetición de 1 topic con 1 size para verificar que todo funcion
 """
 import sys
 import os
+import argparse
+import asyncio
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from llm_benchmark import *
+from llm_benchmark import _SAFE_TABLE
 
-def quick_test():
+def quick_test(use_cache: bool = False):
     print("\n" + "="*60)
     print("QUICK TEST - EXPERIMENTS MODE")
     print("="*60 + "\n")
@@ -28,6 +31,9 @@ def quick_test():
     
     lm_studio_url = settings.get('lm_studio_url', 'http://localhost:1234/v1')
     output_dir = settings.get('output_directory', './benchmark_results')
+    concurrency = settings.get('concurrency', 1)
+    max_retries = settings.get('max_retries', 3)
+    rate_qps = settings.get('rate_qps')
     
     # Extract experiment parameters (REDUCED FOR TESTING)
     template = experiments_config.get('template')
@@ -49,6 +55,9 @@ def quick_test():
     print(f"  - Repetitions: {repetitions}")
     print(f"\nTotal queries: {len(models) * len(topics) * len(sizes_dict) * repetitions}\n")
     
+    # Created once here; the database writes into it without checking again
+    os.makedirs(output_dir, exist_ok=True)
+    
     # Initialize LM Studio Manager
     base_url = lm_studio_url.replace('/v1', '')
     manager = LMStudioManager(base_url=base_url)
@@ -57,80 +66,85 @@ def quick_test():
         print("❌ Cannot connect to LM Studio server. Make sure it's running.")
         return
     
+    # Fail now rather than partway through the test
+    problems = validate_experiment(template, topics, sizes_dict, models, {lm_studio_url: manager}, output_dir,
+                                   concurrency=concurrency, max_retries=max_retries, rate_qps=rate_qps)
+    if problems:
+        print("❌ Invalid experiment configuration:")
+        for problem in problems:
+            print(f"   - {problem}")
+        manager.close()
+        return
+    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    queries = build_queries(template, topics, sizes_dict, repetitions)
     
-    # Process first model only
-    for model_idx, model_name in enumerate(models, 1):
-        print("\n" + "="*60)
-        print(f"MODEL {model_idx}/{len(models)}: {model_name}")
-        print("="*60)
-        
-        # Load the model
-        print(f"\n🔄 Loading model: {model_name}")
-        if not manager.load_model(model_name):
-            print(f"❌ Failed to load model {model_name}. Skipping...")
-            continue
-        
-        # Create database for this model
-        model_safe_name = model_name.replace('/', '_').replace(' ', '_')
-        filename = f"benchmark_TEST_{model_safe_name}_{timestamp}.json"
-        db = BenchmarkDatabase(output_dir=output_dir, filename=filename)
-        
-        # Create client
-        client = LMStudioClient(base_url=lm_studio_url, model=model_name)
-        
-        total_queries = len(topics) * len(sizes_dict) * repetitions
-        query_count = 0
-        
-        print(f"\n🚀 Starting quick test for {model_name}...")
-        print("-" * 60)
+    # Optional response cache: repeated quick tests skip identical requests
+    cache = None
+    try:
+        if use_cache:
+            cache = ResponseCache(os.path.join(output_dir, "response_cache.sqlite"))
         
-        # For each topic
-        for topic_idx, topic in enumerate(topics, 1):
-            print(f"\n📍 Topic {topic_idx}/{len(topics)}: {topic}")
+        # Process first model only
+        for model_idx, model_name in enumerate(models, 1):
+            print("\n" + "="*60)
+            print(f"MODEL {model_idx}/{len(models)}: {model_name}")
+            print("="*60)
+            
+            # Load the model
+            print(f"\n🔄 Loading model: {model_name}")
+            if not manager.load_model(model_name):
+                print(f"❌ Failed to load model {model_name}. Skipping...")
+                continue
             
-            # For each size
-            for size_name, size_value in sizes_dict.items():
-                prompt = template.format(size=size_value, topic=topic)
+            # Create database for this model
+            model_safe_name = model_name.translate(_SAFE_TABLE)
+            filename = f"benchmark_TEST_{model_safe_name}_{timestamp}.json"
+            db = BenchmarkDatabase(output_dir=output_dir, filename=filename, ensure_dir=False)
+            try:
+                # Create client
+                client = LMStudioClient(base_url=lm_studio_url, model=model_name, pool_size=concurrency,
+                                        cache=cache, max_retries=max_retries)
                 
-                print(f"  📊 Size: {size_name} ({size_value} words)")
+                print(f"\n🚀 Starting quick test for {model_name}...")
+                print("-" * 60)
                 
-                # Repeat N times
-                for rep in range(1, repetitions + 1):
-                    query_count += 1
-                    print(f"    [{query_count}/{total_queries}] Rep {rep}/{repetitions}... ", end="")
-                    
-                    metrics = client.send_request(
-                        prompt=prompt,
-                        max_tokens=size_value * 2,
-                        temperature=0.7
-                    )
-                    
-                    # Add experiment metadata
-                    metrics['topic'] = topic
-                    metrics['size_category'] = size_name
-                    metrics['size_words'] = size_value
-                    metrics['repetition'] = rep
-                    
-                    db.add_result(metrics)
-                    
-                    time.sleep(0.5)  # Shorter delay for testing
-        
-        print("\n" + "-" * 60)
-        print(f"✅ Quick test completed for model: {model_name}")
-        
-        # Save results
-        print(f"💾 Saving results to: {db.json_file}")
-        db.save_all()
-        db.print_summary()
+                # Shorter delay for testing
+                try:
+                    asyncio.run(run_benchmark_queries(client, db, queries, concurrency=concurrency, delay=0.5,
+                                                      rate_qps=rate_qps))
+                finally:
+                    client.close()
+                
+                print("\n" + "-" * 60)
+                print(f"✅ Quick test completed for model: {model_name}")
+                
+                # Save results
+                print(f"💾 Saving results to: {db.json_file}")
+                db.save_all()
+                db.print_summary()
+            finally:
+                db.close()
+    finally:
+        manager.close()
+        if cache is not None:
+            cache.close()
     
     print("\n" + "="*60)
     print("🎉 QUICK TEST COMPLETED!")
     print("="*60)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quick test of the experiments setup')
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='Answer repeated identical requests from a local response cache'
+    )
+    args = parser.parse_args()
+    
     try:
-        quick_test()
+        quick_test(use_cache=args.cache)
     except KeyboardInterrupt:
         print("\n\nTest interrupted by user.")
     except Exception as e:
@@ -2,11 +2,16 @@
 """
 Script para probar la configuración de experiments antes de ejecutar todo.
 """
-import yaml
+import json
+import tempfile
+
+import orjson
+
+# Misma carga (y mismo loader YAML) que usa el benchmark
+from llm_benchmark import BenchmarkDatabase, load_experiments_config
 
 def test_experiments_config():
-    with open('experiments.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+    config = load_experiments_config('experiments.yaml')
     
     print("=== Configuración de Experimentos ===\n")
     
@@ -49,5 +54,38 @@ def test_experiments_config():
     print(f"Queries totales: {total_overall}")
     print(f"Archivos JSON a generar: {len(models)}")
 
+def test_benchmark_database_json():
+    """Comprueba que el JSON combinado que arma BenchmarkDatabase contiene exactamente los resultados escritos."""
+    resultados = [
+        {"status": "success", "elapsed_time_seconds": 1.25, "prompt": "Hablame de España",
+         "response": "línea 1\nlínea 2 \"citada\"", "prompt_length_chars": 17, "response_length_chars": 22,
+         "total_tokens": 40, "size_category": "short", "repetition": 1},
+        {"status": "timeout", "elapsed_time_seconds": 300.0, "prompt": "x", "response": None,
+         "prompt_length_chars": 1, "response_length_chars": 0, "total_tokens": None},
+        {"status": "cache_hit", "elapsed_time_seconds": 0.0, "prompt": "y", "response": "z",
+         "prompt_length_chars": 1, "response_length_chars": 1, "total_tokens": 3, "attempts": 0},
+    ]
+    
+    # Sin resultados, uno y varios: el caso vacío tiene su propio cierre de la lista
+    for n in (0, 1, len(resultados)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = BenchmarkDatabase(output_dir=tmp, filename="prueba.json")
+            for resultado in resultados[:n]:
+                db.add_result(resultado)
+            db.save_all()
+            
+            with open(db.json_file, 'rb') as f:
+                contenido = f.read()
+        
+        datos = json.loads(contenido)
+        assert datos['results'] == resultados[:n]
+        assert datos['metadata']['total_requests'] == n
+        # Mismo formato que volcar el documento entero con sangría de 2 espacios
+        assert contenido == orjson.dumps(datos, option=orjson.OPT_INDENT_2)
+    
+    print("\n=== BenchmarkDatabase ===")
+    print("JSON combinado: OK (0, 1 y varios resultados)")
+
 if __name__ == "__main__":
     test_experiments_config()
+    test_benchmark_database_json()